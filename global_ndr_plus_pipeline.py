@@ -1,14 +1,20 @@
 """Global NDR Processing Pipeline."""
 import argparse
+import atexit
 import collections
+import concurrent.futures
+import csv
+import functools
 import glob
 import logging
+import logging.handlers
 import importlib
+import itertools
+import math
 import multiprocessing
 import os
 import pathlib
-import re
-import subprocess
+import queue
 import sqlite3
 import shutil
 import time
@@ -19,13 +25,18 @@ from inspring.ndr_plus.ndr_plus import ndr_plus
 from osgeo import gdal
 from osgeo import osr
 import ecoshard
-import pandas
 import pygeoprocessing
 import numpy
 import retrying
 import taskgraph
+try:
+    import numba
+except ImportError:
+    # optional, scrub_raster falls back to numpy without it
+    numba = None
+
+from scenarios import ECOSHARD_PREFIX
 
-gdal.SetCacheMax(2**27)
 logging.getLogger('taskgraph').setLevel(logging.INFO)
 
 WORKSPACE_DIR = 'global_ndr_plus_workspace'
@@ -37,10 +48,6 @@ COMPUTED_STATUS = 'computed'  # use when computed but not stitched
 COMPLETE_STATUS = 'complete'  # use when stitched and deleted
 USE_AG_LOAD_ID = 999
 
-# All links in this dict is an ecoshard that will be downloaded to
-# ECOSHARD_DIR
-ECOSHARD_PREFIX = 'https://storage.googleapis.com/'
-
 WATERSHED_ID = 'hydrosheds_15arcseconds'
 
 # Known properties of the DEM:
@@ -52,12 +59,21 @@ DEM_VRT_PATH = os.path.join(DEM_TILE_DIR, 'global_dem_3s.vrt')
 RETENTION_LENGTH_M = 150
 K_VAL = 1.0
 TARGET_CELL_LENGTH_M = 300
-FLOW_THRESHOLD = int(500**2*90 / TARGET_CELL_LENGTH_M**2)
+FLOW_THRESHOLD = (500 * 500 * 90) // (TARGET_CELL_LENGTH_M ** 2)
 MAX_PIXEL_FILL_COUNT = 500  # distance to search to fill a pixel
 ROUTING_ALGORITHM = 'D8'
 TARGET_WGS84_LENGTH_DEG = 10/3600
 BASE_WGS84_LENGTH_DEG = 10/3600/2
 AREA_DEG_THRESHOLD = 0.000016 * 10  # this is 10 times larger than hydrosheds 1 "pixel" watersheds
+STITCH_QUEUE_SIZE = 32  # finished watersheds that can wait to be stitched
+STITCH_TILE_SIZE = 512  # block size of the global stitch rasters
+STITCH_GDAL_CACHEMAX = 2**27  # fixed GDAL cache bytes per stitch process
+STITCH_WORKER_CHECK_SECONDS = 30  # how often to check the stitchers are alive
+PENDING_WATERSHEDS_PER_WORKER = 4  # watershed tasks submitted per ndr worker
+
+_WGS84_SRS = osr.SpatialReference()
+_WGS84_SRS.ImportFromEPSG(4326)
+WGS84_WKT = _WGS84_SRS.ExportToWkt()
 
 # base ecoshards that will be added to by scenario modules
 ECOSHARDS = {
@@ -70,6 +86,44 @@ SCENARIOS = {}
 SCRUB_IDS = set()
 
 
+class _ProcessLocalQueueHandler(logging.handlers.QueueHandler):
+    """Queue records for the listener thread, or write them directly.
+
+    The listener thread only runs in the process that created this handler,
+    forked children (like taskgraph workers) write straight to the file
+    handlers instead.
+    """
+
+    def __init__(self, log_queue, handler_list):
+        """Create handler.
+
+        Args:
+            log_queue (queue.Queue): queue drained by a
+                ``logging.handlers.QueueListener`` in this process.
+            handler_list (list): the handlers that listener writes to, used
+                directly when emitting from a forked process.
+        """
+        super().__init__(log_queue)
+        self._pid = os.getpid()
+        self._handler_list = handler_list
+
+    def emit(self, record):
+        if os.getpid() == self._pid:
+            super().emit(record)
+            return
+        for handler in self._handler_list:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+# loggers only queue their records, a single listener thread does the file
+# writes so logging doesn't block the caller
+_LOG_FILE_HANDLER_LIST = []
+_LOG_QUEUE = queue.Queue()
+_LOG_QUEUE_HANDLER = _ProcessLocalQueueHandler(
+    _LOG_QUEUE, _LOG_FILE_HANDLER_LIST)
+
+
 def _setup_logger(name, log_file, level):
     """Create arbitrary logger to file.
 
@@ -81,12 +135,15 @@ def _setup_logger(name, log_file, level):
     Return:
         logger object
     """
-    handler = logging.FileHandler(log_file)
+    handler = logging.FileHandler(log_file, delay=True)
     formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
     handler.setFormatter(formatter)
+    # all loggers share one queue, so only write this logger's records
+    handler.addFilter(logging.Filter(name))
+    _LOG_FILE_HANDLER_LIST.append(handler)
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    logger.addHandler(handler)
+    logger.addHandler(_LOG_QUEUE_HANDLER)
     return logger
 
 
@@ -95,16 +152,84 @@ PYGEOPROCESSING_LOGGER = _setup_logger('pygeoprocessing', 'pygeoprocessinglog.ou
 INSPRING_LOGGER = _setup_logger('inspring', 'inspringlog.out', level=logging.DEBUG)
 REPORT_WATERSHED_LOGGER = _setup_logger('report_watershed', 'report_watershed.out', level=logging.DEBUG)
 ECOSHARD_LOGGER = _setup_logger('ecoshard', 'ecoshard.out', level=logging.DEBUG)
+_LOG_QUEUE_LISTENER = logging.handlers.QueueListener(
+    _LOG_QUEUE, *_LOG_FILE_HANDLER_LIST, respect_handler_level=True)
+_LOG_QUEUE_LISTENER.start()
+atexit.register(_LOG_QUEUE_LISTENER.stop)
+
+# deletes stitched workspaces in the background so stitching can continue
+_WORKSPACE_CLEANUP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=4)
+
+
+# sqlite connections are cached per thread and per process since they can't
+# be shared across either
+_SQLITE_CONNECTION_CACHE = threading.local()
+
+
+def _get_sqlite_connection(database_path, mode):
+    """Return a cached connection to ``database_path`` for this thread.
+
+    Args:
+        database_path (str): path to the SQLite database to operate on.
+        mode (str): must be either 'read_only' or 'modify'.
+
+    Returns:
+        ``sqlite3.Connection`` that stays open until the thread exits.
+
+    """
+    pid = os.getpid()
+    if getattr(_SQLITE_CONNECTION_CACHE, 'pid', None) != pid:
+        # first use in this thread, or a forked child with the parent's cache
+        _SQLITE_CONNECTION_CACHE.pid = pid
+        _SQLITE_CONNECTION_CACHE.connection_map = {}
+    connection_map = _SQLITE_CONNECTION_CACHE.connection_map
+    connection_key = (os.path.abspath(database_path), mode)
+    connection = connection_map.get(connection_key)
+    if connection is not None:
+        return connection
+
+    if mode == 'read_only':
+        ro_uri = r'%s?mode=ro' % pathlib.Path(
+            os.path.abspath(database_path)).as_uri()
+        connection = sqlite3.connect(ro_uri, uri=True)
+    elif mode == 'modify':
+        # implicit transactions take the write lock up front so a batch
+        # commits in one go rather than failing to upgrade a read lock
+        connection = sqlite3.connect(
+            database_path, isolation_level='IMMEDIATE')
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA temp_store=MEMORY')
+    else:
+        raise ValueError('Unknown mode: %s' % mode)
+    # not closed explicitly, close() only works from the creating thread,
+    # the connection is closed when it's collected after its thread exits
+    connection_map[connection_key] = connection
+    return connection
+
+
+def _drop_sqlite_connection(database_path, mode):
+    """Close and forget this thread's cached connection if there is one."""
+    if getattr(_SQLITE_CONNECTION_CACHE, 'pid', None) != os.getpid():
+        return
+    connection = _SQLITE_CONNECTION_CACHE.connection_map.pop(
+        (os.path.abspath(database_path), mode), None)
+    if connection is not None:
+        connection.close()
 
 
 @retrying.retry(
-    wait_exponential_multiplier=500, wait_exponential_max=3200,
+    wait_incrementing_start=500, wait_incrementing_increment=500,
     stop_max_attempt_number=100)
 def _execute_sqlite(
         sqlite_command, database_path, argument_list=None,
         mode='read_only', execute='execute', fetch=None):
     """Execute SQLite command and attempt retries on a failure.
 
+    Connections are reused across calls from the same thread, see
+    ``_get_sqlite_connection``.
+
     Args:
         sqlite_command (str): a well formatted SQLite command.
         database_path (str): path to the SQLite database to operate on.
@@ -123,14 +248,7 @@ def _execute_sqlite(
     cursor = None
     connection = None
     try:
-        if mode == 'read_only':
-            ro_uri = r'%s?mode=ro' % pathlib.Path(
-                os.path.abspath(database_path)).as_uri()
-            connection = sqlite3.connect(ro_uri, uri=True)
-        elif mode == 'modify':
-            connection = sqlite3.connect(database_path)
-        else:
-            raise ValueError('Unknown mode: %s' % mode)
+        connection = _get_sqlite_connection(database_path, mode)
 
         if execute == 'execute':
             if argument_list is None:
@@ -155,28 +273,62 @@ def _execute_sqlite(
         if payload is not None:
             result = list(payload)
         cursor.close()
-        connection.commit()
-        connection.close()
         cursor = None
-        connection = None
+        connection.commit()
         return result
     except sqlite3.OperationalError:
         LOGGER.exception(
             f'{database_path} database is locked because another process is '
             'using it, waiting for a bit of time to try again\n'
             f'{sqlite_command}')
+        # start the retry from a clean connection
+        _drop_sqlite_connection(database_path, mode)
         raise
     except Exception:
         LOGGER.exception(
             f'Exception on _execute_sqlite: {sqlite_command}\n'
             f'  and the argument list is: {argument_list}')
+        if connection is not None:
+            connection.rollback()
         raise
     finally:
         if cursor is not None:
             cursor.close()
-        if connection is not None:
-            connection.commit()
-            connection.close()
+
+
+@retrying.retry(
+    wait_incrementing_start=500, wait_incrementing_increment=500,
+    stop_max_attempt_number=100)
+def _iterate_sqlite(
+        sqlite_command, database_path, argument_list=(), chunk_size=10000):
+    """Yield the rows of a read only query in chunks.
+
+    Unlike ``_execute_sqlite`` with ``fetch='all'`` the full result is never
+    held in memory at once. Retries only apply to starting the query.
+
+    Args:
+        sqlite_command (str): a well formatted SQLite query.
+        database_path (str): path to the SQLite database to query.
+        argument_list (list): parameters for ``sqlite_command``.
+        chunk_size (int): number of rows to fetch from sqlite at a time.
+
+    Returns:
+        generator of result rows.
+
+    """
+    connection = _get_sqlite_connection(database_path, 'read_only')
+    cursor = connection.execute(sqlite_command, argument_list)
+
+    def _row_generator():
+        try:
+            while True:
+                row_list = cursor.fetchmany(chunk_size)
+                if not row_list:
+                    break
+                yield from row_list
+        finally:
+            cursor.close()
+    return _row_generator()
 
 
 def _create_work_table_schema(database_path):
@@ -192,16 +344,19 @@ def _create_work_table_schema(database_path):
     """
     sql_create_table_script = (
         """
-        CREATE TABLE work_status (
+        CREATE TABLE IF NOT EXISTS work_status (
             scenario_id TEXT NOT NULL,
             watershed_id TEXT NOT NULL,
             watershed_area FLOAT NOT NULL,
             status TEXT NOT NULL,
             PRIMARY KEY (scenario_id, watershed_id)
         );
+        -- lets the largest-first work query scan in order without a sort
+        CREATE INDEX IF NOT EXISTS work_status_area_index
+            ON work_status (watershed_area DESC, status);
         """)
 
-    # create the base table
+    # create the base table, or add anything missing from an older one
     _execute_sqlite(
         sql_create_table_script, database_path,
         mode='modify', execute='script')
@@ -223,6 +378,77 @@ def _set_work_status(database_path, watershed_id_status_list):
         raise
 
 
+def _read_ahead(iterable, max_ahead=2):
+    """Iterate ``iterable`` on a background thread that stays ahead.
+
+    Used to overlap GDAL block reads, which release the GIL, with numpy work
+    on the previous block. Exceptions raised by ``iterable`` are re-raised to
+    the caller and the background thread stops if the caller stops early.
+
+    Args:
+        iterable (iterable): source of items, e.g. the generator returned by
+            ``pygeoprocessing.iterblocks``.
+        max_ahead (int): maximum number of items read but not yet consumed.
+
+    Yields:
+        the items of ``iterable`` in order.
+    """
+    item_queue = queue.Queue(max_ahead)
+    stop_event = threading.Event()
+
+    def _put(payload):
+        # give up if the consumer has gone away rather than block forever
+        while not stop_event.is_set():
+            try:
+                item_queue.put(payload, timeout=1.0)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _producer():
+        try:
+            for item in iterable:
+                if not _put((True, item)):
+                    return
+        except Exception as error:
+            _put((False, error))
+            return
+        _put((False, None))
+
+    producer_thread = threading.Thread(target=_producer, daemon=True)
+    producer_thread.start()
+    try:
+        while True:
+            is_item, payload = item_queue.get()
+            if is_item:
+                yield payload
+            elif payload is None:
+                return
+            else:
+                raise payload
+    finally:
+        stop_event.set()
+        producer_thread.join()
+
+
+@functools.lru_cache(maxsize=512)
+def _cached_raster_info(raster_path, raster_mtime):
+    """Memoized ``pygeoprocessing.get_raster_info``, see ``_get_raster_info``."""
+    return pygeoprocessing.get_raster_info(raster_path)
+
+
+def _get_raster_info(raster_path):
+    """Return ``pygeoprocessing.get_raster_info`` for ``raster_path``.
+
+    Results are cached per process and keyed on the absolute path and its
+    modification time so a rewritten raster is read again. The returned
+    dictionary is shared between calls and must not be modified.
+    """
+    raster_path = os.path.abspath(raster_path)
+    return _cached_raster_info(raster_path, os.path.getmtime(raster_path))
+
+
 def detect_invalid_values(base_raster_path, rtol=0.001, max_abs=1e30):
     """Return error if an invalid value is found in the raster.
 
@@ -232,18 +458,25 @@ def detect_invalid_values(base_raster_path, rtol=0.001, max_abs=1e30):
     ``True``.
     """
     numpy.set_printoptions(precision=15)
-    base_nodata = pygeoprocessing.get_raster_info(
-        base_raster_path)['nodata'][0]
-    for _, block_array in pygeoprocessing.iterblocks((base_raster_path, 1)):
-        non_finite_mask = ~numpy.isfinite(block_array)
-        if non_finite_mask.any():
+    base_nodata = _get_raster_info(base_raster_path)['nodata'][0]
+    if base_nodata is not None:
+        # tolerances ``numpy.isclose`` would use against a scalar nodata
+        close_tolerance = 1e-8 + rtol * abs(base_nodata)
+        equal_tolerance = 1e-8 + 1e-5 * abs(base_nodata)
+    for _, block_array in _read_ahead(pygeoprocessing.iterblocks(
+            (base_raster_path, 1), largest_block=2**20)):
+        if not numpy.isfinite(block_array).all():
+            non_finite_mask = ~numpy.isfinite(block_array)
             return (
                 f'found some non-finite values in {base_raster_path}: '
                 f'{block_array[non_finite_mask]}')
         if base_nodata is not None:
-            close_to_nodata_mask = numpy.isclose(
-                block_array, base_nodata, rtol=rtol) & ~numpy.isclose(
-                block_array, base_nodata)
+            nodata_distance = numpy.subtract(
+                block_array, base_nodata, dtype=numpy.float64)
+            numpy.abs(nodata_distance, out=nodata_distance)
+            close_to_nodata_mask = (
+                (nodata_distance <= close_tolerance) &
+                (nodata_distance > equal_tolerance))
             if close_to_nodata_mask.any():
                 return (
                     f'found some values that are close to nodata {base_nodata} '
@@ -251,9 +484,12 @@ def detect_invalid_values(base_raster_path, rtol=0.001, max_abs=1e30):
                     f'nodata in {base_raster_path}: '
                     f'{block_array[close_to_nodata_mask]}')
 
+        # only build the mask if there's something large enough to report
+        if numpy.abs(block_array).max() < max_abs:
+            continue
         large_value_mask = (numpy.abs(block_array) >= max_abs)
         if base_nodata is not None:
-            large_value_mask &= ~numpy.isclose(block_array, base_nodata)
+            large_value_mask &= nodata_distance > equal_tolerance
         if large_value_mask.any():
             return (
                 f'found some very large values not close to {base_nodata} in '
@@ -262,6 +498,43 @@ def detect_invalid_values(base_raster_path, rtol=0.001, max_abs=1e30):
     return True
 
 
+@functools.lru_cache(maxsize=None)
+def _compile_scrub_kernel(scrub_nodata, max_abs, close_tolerance):
+    """Build a numba kernel that scrubs a 2D block in place in one pass.
+
+    The returned function sets non-finite values, values with an absolute
+    value at least ``max_abs``, and values within ``close_tolerance`` of
+    ``scrub_nodata`` to ``scrub_nodata`` and returns a tuple of how many
+    non-finite, large, and close to nodata values it found. The arguments
+    are baked in as constants and numba specializes it on the block dtype
+    the first time it's called. It releases the GIL so it can run on
+    several threads at once.
+
+    Requires ``numba``.
+    """
+    @numba.njit(nogil=True)
+    def _scrub_kernel(block_array):
+        non_finite_count = 0
+        large_value_count = 0
+        close_to_nodata = 0
+        for row_index in range(block_array.shape[0]):
+            for col_index in range(block_array.shape[1]):
+                value = block_array[row_index, col_index]
+                if not numpy.isfinite(value):
+                    non_finite_count += 1
+                    block_array[row_index, col_index] = scrub_nodata
+                elif abs(value) >= max_abs:
+                    large_value_count += 1
+                    block_array[row_index, col_index] = scrub_nodata
+                # float distance so unsigned blocks can't wrap around
+                if abs(float(block_array[row_index, col_index]) -
+                       scrub_nodata) <= close_tolerance:
+                    close_to_nodata += 1
+                    block_array[row_index, col_index] = scrub_nodata
+        return non_finite_count, large_value_count, close_to_nodata
+    return _scrub_kernel
+
+
 def scrub_raster(
         base_raster_path, target_raster_path, target_nodata=None,
         rtol=0.001, max_abs=1e30):
@@ -286,11 +559,11 @@ def scrub_raster(
         None
     """
     LOGGER.debug(f'scrubbing {base_raster_path}')
-    if (os.path.exists(target_raster_path) and
-            os.path.samefile(base_raster_path, target_raster_path)):
+    if os.path.realpath(base_raster_path) == os.path.realpath(
+            target_raster_path):
         raise ValueError(
             f'{base_raster_path} and {target_raster_path} are the same file')
-    base_raster_info = pygeoprocessing.get_raster_info(base_raster_path)
+    base_raster_info = _get_raster_info(base_raster_path)
     base_nodata = base_raster_info['nodata'][0]
     if base_nodata is None and target_nodata is None:
         raise ValueError('value base and target nodata are both None')
@@ -310,30 +583,71 @@ def scrub_raster(
     large_value_count = 0
     close_to_nodata = 0
 
+    # same tolerance ``numpy.isclose`` would use against a scalar nodata
+    close_tolerance = 1e-8 + rtol * abs(scrub_nodata)
+
+    if numba is not None:
+        scrub_kernel = _compile_scrub_kernel(
+            float(scrub_nodata), float(max_abs), close_tolerance)
+
     def _scrub_op(base_array):
+        """Scrub ``base_array`` in place and return it with value counts."""
+        if numba is not None:
+            return (base_array, *scrub_kernel(base_array))
+        invalid_mask = ~numpy.isfinite(base_array)
+        block_non_finite_count = numpy.count_nonzero(invalid_mask)
+        with numpy.errstate(invalid='ignore'):
+            invalid_mask |= numpy.abs(base_array) >= max_abs
+        block_large_value_count = (
+            numpy.count_nonzero(invalid_mask) - block_non_finite_count)
+        numpy.putmask(base_array, invalid_mask, scrub_nodata)
+
+        # float64 difference so unsigned blocks can't wrap around
+        nodata_distance = numpy.subtract(
+            base_array, scrub_nodata, dtype=numpy.float64)
+        numpy.abs(nodata_distance, out=nodata_distance)
+        close_to_nodata_mask = nodata_distance <= close_tolerance
+        numpy.putmask(base_array, close_to_nodata_mask, scrub_nodata)
+        return (
+            base_array, block_non_finite_count, block_large_value_count,
+            numpy.count_nonzero(close_to_nodata_mask))
+
+    pygeoprocessing.new_raster_from_base(
+        base_raster_path, target_raster_path, base_raster_info['datatype'],
+        [scrub_nodata])
+    target_raster = gdal.OpenEx(
+        target_raster_path, gdal.OF_RASTER | gdal.GA_Update)
+    target_band = target_raster.GetRasterBand(1)
+
+    def _write_block(offset_dict, scrub_future):
         nonlocal non_finite_count
         nonlocal large_value_count
         nonlocal close_to_nodata
-        result = numpy.copy(base_array)
-        non_finite_mask = ~numpy.isfinite(result)
-        non_finite_count += numpy.count_nonzero(non_finite_mask)
-        result[non_finite_mask] = scrub_nodata
-
-        large_value_mask = numpy.abs(result) >= max_abs
-        large_value_count += numpy.count_nonzero(large_value_mask)
-        result[large_value_mask] = scrub_nodata
-
-        close_to_nodata_mask = numpy.isclose(
-            result, scrub_nodata, rtol=rtol)
-        close_to_nodata += numpy.count_nonzero(close_to_nodata_mask)
-        result[close_to_nodata_mask] = scrub_nodata
-        return result
-
-    LOGGER.debug(
-        f'starting raster_calculator op for scrubbing {base_raster_path}')
-    pygeoprocessing.raster_calculator(
-        [(base_raster_path, 1)], _scrub_op, target_raster_path,
-        base_raster_info['datatype'], scrub_nodata)
+        (result, block_non_finite_count, block_large_value_count,
+         block_close_to_nodata) = scrub_future.result()
+        non_finite_count += block_non_finite_count
+        large_value_count += block_large_value_count
+        close_to_nodata += block_close_to_nodata
+        target_band.WriteArray(
+            result, xoff=offset_dict['xoff'], yoff=offset_dict['yoff'])
+
+    # numpy releases the GIL on the scrub ops so blocks are scrubbed on a
+    # thread pool while this thread reads ahead and does all the writes
+    LOGGER.debug(f'starting threaded scrub of {base_raster_path}')
+    n_threads = os.cpu_count()
+    pending_block_queue = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=n_threads) as scrub_executor:
+        for offset_dict, block_array in pygeoprocessing.iterblocks(
+                (base_raster_path, 1), largest_block=2**20):
+            pending_block_queue.append(
+                (offset_dict, scrub_executor.submit(_scrub_op, block_array)))
+            if len(pending_block_queue) > 2 * n_threads:
+                _write_block(*pending_block_queue.popleft())
+        while pending_block_queue:
+            _write_block(*pending_block_queue.popleft())
+    target_band = None
+    target_raster = None
 
     if any([non_finite_count, large_value_count, close_to_nodata]):
         LOGGER.warning(
@@ -353,121 +667,207 @@ def create_empty_wgs84_raster(cell_size, nodata, target_path):
     gtiff_driver = gdal.GetDriverByName('GTIFF')
     target_raster = gtiff_driver.Create(
         target_path, n_cols, n_rows, 1, gdal.GDT_Float32,
+        # this is only the stitching target, it's left uncompressed so each
+        # batch doesn't decompress and recompress the tiles it touches, the
+        # compressed copy is made in ``upsample_compress_and_overview``
         options=(
-            'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=LZW',
-            'BLOCKXSIZE=256', 'BLOCKYSIZE=256'))
+            'TILED=YES', 'BIGTIFF=YES', 'COMPRESS=NONE',
+            f'BLOCKXSIZE={STITCH_TILE_SIZE}', f'BLOCKYSIZE={STITCH_TILE_SIZE}',
+            # don't write nodata filled blocks that nothing stitches into
+            'SPARSE_OK=TRUE'))
 
     target_band = target_raster.GetRasterBand(1)
     target_band.SetNoDataValue(nodata)
-    wgs84_srs = osr.SpatialReference()
-    wgs84_srs.ImportFromEPSG(4326)
-    target_raster.SetProjection(wgs84_srs.ExportToWkt())
+    target_raster.SetProjection(WGS84_WKT)
     target_raster.SetGeoTransform(
         [-180, cell_size, 0.0, 90.0, 0.0, -cell_size])
     target_raster = None
 
 
+def _prefetch_files(path_list):
+    """Ask the kernel to start reading ``path_list`` into the page cache.
+
+    This is only a hint and returns immediately, it is a no-op on platforms
+    without ``os.posix_fadvise``.
+
+    Args:
+        path_list (list): paths to files that are about to be read in full.
+
+    Return:
+        ``None``
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for path in path_list:
+        file_descriptor = os.open(path, os.O_RDONLY)
+        try:
+            # WILLNEED starts the read even after the descriptor is closed
+            os.posix_fadvise(
+                file_descriptor, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(file_descriptor)
+
+
+def _wgs84_tile_index(raster_path):
+    """Return the (row, col) stitch raster tile of ``raster_path``'s corner."""
+    raster_info = _get_raster_info(raster_path)
+    min_x, _, _, max_y = pygeoprocessing.transform_bounding_box(
+        raster_info['bounding_box'], raster_info['projection_wkt'],
+        WGS84_WKT)
+    tile_length_deg = STITCH_TILE_SIZE * BASE_WGS84_LENGTH_DEG
+    return (
+        int((90 - max_y) // tile_length_deg),
+        int((min_x + 180) // tile_length_deg))
+
+
+def _init_stitch_process():
+    """Set the fixed ``STITCH_GDAL_CACHEMAX`` GDAL cache in this process.
+
+    There are three stitch processes per scenario that aren't counted in the
+    ``_configure_gdal_cache`` split, so they each get a small fixed cache
+    rather than inheriting a watershed worker's share.
+    """
+    gdal.SetCacheMax(STITCH_GDAL_CACHEMAX)
+    os.environ['GDAL_CACHEMAX'] = str(STITCH_GDAL_CACHEMAX)
+
+
 @retrying.retry(stop_max_attempt_number=100)
 def stitch_worker(
         scenario_id, stitch_export_raster_path,
         stitch_modified_load_raster_path,
-        stitch_queue, remove_workspaces):
-    """Take elements from stitch queue and stitch into target."""
-    try:
-        export_raster_list = []
-        modified_load_raster_list = []
-        workspace_list = []
-        status_update_list = []
-        watershed_process_count = collections.defaultdict(int)
-        while True:
-            payload = stitch_queue.get()
-            if payload is not None:
-                (export_raster_path, modified_load_raster_path,
-                 workspace_dir, watershed_basename, watershed_id) = payload
-                watershed_process_count[watershed_basename] += 1
-                status_update_list.append(
-                    (COMPLETE_STATUS, scenario_id, watershed_id))
-
-                export_raster_list.append((export_raster_path, 1))
-                modified_load_raster_list.append((modified_load_raster_path, 1))
-                workspace_list.append(workspace_dir)
-
-                for path in (export_raster_path, modified_load_raster_path):
-                    if not os.path.exists(path):
-                        raise ValueError(
-                            f'this path {path} was to stitch into '
-                            f'{stitch_export_raster_path} or '
-                            f'{stitch_modified_load_raster_path} but does not '
-                            'exist: ')
-
-            if len(workspace_list) < 100 and payload is not None:
-                continue
-
-            worker_list = []
-            for target_stitch_raster_path, raster_list in [
-                    (stitch_export_raster_path, export_raster_list),
-                    (stitch_modified_load_raster_path,
-                     modified_load_raster_list)]:
-                stitch_worker = threading.Thread(
-                    target=pygeoprocessing.stitch_rasters,
-                    args=(
-                        raster_list,
-                        ['near']*len(raster_list),
-                        (target_stitch_raster_path, 1)),
-                    kwargs={
-                        'overlap_algorithm': 'etch',
-                        'area_weight_m2_to_wgs84': True})
-                stitch_worker.start()
-                worker_list.append((stitch_worker, raster_list))
-            for worker, raster_list in worker_list:
-                LOGGER.debug(f'waiting for this raster list to stitch: {raster_list}')
-                worker.join()
-                LOGGER.debug(f'done on that last stitch')
-            if remove_workspaces:
-                LOGGER.debug(f'removing {len(workspace_list)} workspaces')
-                for workspace_dir in workspace_list:
-                    shutil.rmtree(workspace_dir)
+        stitch_queue, remove_workspaces, work_status_updated):
+    """Take elements from stitch queue and stitch into target.
 
+    ``work_status_updated`` is a ``multiprocessing.Manager`` event that is
+    set each time a batch is marked complete so the progress report in the
+    parent process can update.
+    """
+    # the stitches are GDAL bound and hold the GIL, so export and load are
+    # stitched in their own processes, each with its own GDAL block cache
+    _init_stitch_process()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=2,
+                initializer=_init_stitch_process) as stitch_executor:
             export_raster_list = []
             modified_load_raster_list = []
             workspace_list = []
-            watershed_process_count = collections.defaultdict(int)
-
-            _set_work_status(
-                WORK_STATUS_DATABASE_PATH,
-                status_update_list)
             status_update_list = []
-
-            if payload is None:
-                stitch_queue.put(None)
-                break
-        if payload is None and remove_workspaces is not None:
-            # all done, time to build overview and compress
-            LOGGER.debug(
-                f'building overviews and compressing results '
-                f'for {stitch_export_raster_path} and '
-                f'{stitch_modified_load_raster_path}')
-            build_overview_thread_list = []
-            for base_raster_path in [
-                    stitch_export_raster_path,
-                    stitch_modified_load_raster_path]:
-                upsample_raster_path = os.path.join(
-                    WORKSPACE_DIR,
-                    f'upsample_{os.path.basename(base_raster_path)}')
-                compressed_raster_path = os.path.join(
-                    WORKSPACE_DIR,
-                    f'compressed_{os.path.basename(base_raster_path)}')
-                build_overview_process = threading.Thread(
-                    target=upsample_compress_and_overview,
-                    args=(
+            cleanup_future_list = []
+            watershed_process_count = collections.defaultdict(int)
+            while True:
+                payload = stitch_queue.get()
+                if payload is not None:
+                    (export_raster_path, modified_load_raster_path,
+                     workspace_dir, watershed_basename, watershed_id) = payload
+                    watershed_process_count[watershed_basename] += 1
+                    status_update_list.append(
+                        (COMPLETE_STATUS, scenario_id, watershed_id))
+
+                    export_raster_list.append((export_raster_path, 1))
+                    modified_load_raster_list.append((modified_load_raster_path, 1))
+                    workspace_list.append(workspace_dir)
+
+                    for path in (export_raster_path, modified_load_raster_path):
+                        if not os.path.exists(path):
+                            raise ValueError(
+                                f'this path {path} was to stitch into '
+                                f'{stitch_export_raster_path} or '
+                                f'{stitch_modified_load_raster_path} but does not '
+                                'exist: ')
+
+                if len(workspace_list) < 100 and payload is not None:
+                    continue
+
+                # start reading the batch before its headers are read below
+                _prefetch_files(
+                    [path for path, _ in
+                     export_raster_list + modified_load_raster_list])
+                # watersheds show up largest first, not by location, so order
+                # the batch by the target tile each one lands in. Stitches
+                # that share a tile then run back to back and hit it in the
+                # GDAL block cache instead of re-reading and re-writing it.
+                tile_order = sorted(
+                    range(len(export_raster_list)),
+                    key=lambda index: _wgs84_tile_index(
+                        export_raster_list[index][0]))
+                export_raster_list = [
+                    export_raster_list[index] for index in tile_order]
+                modified_load_raster_list = [
+                    modified_load_raster_list[index] for index in tile_order]
+
+                # stitch_rasters is used rather than a VRT mosaic + gdal.Warp
+                # because each watershed is in its own local projection, the
+                # values need area weighting into wgs84 and the target must
+                # keep what earlier batches etched into it
+                stitch_future_list = []
+                for target_stitch_raster_path, raster_list in [
+                        (stitch_export_raster_path, export_raster_list),
+                        (stitch_modified_load_raster_path,
+                         modified_load_raster_list)]:
+                    stitch_future = stitch_executor.submit(
+                        pygeoprocessing.stitch_rasters,
+                        raster_list,
+                        ['near']*len(raster_list),
+                        (target_stitch_raster_path, 1),
+                        overlap_algorithm='etch',
+                        area_weight_m2_to_wgs84=True)
+                    stitch_future_list.append((stitch_future, raster_list))
+                for stitch_future, raster_list in stitch_future_list:
+                    LOGGER.debug(f'waiting for this raster list to stitch: {raster_list}')
+                    stitch_future.result()
+                    LOGGER.debug(f'done on that last stitch')
+                if remove_workspaces:
+                    # let the last batch finish deleting before queuing more so
+                    # removal overlaps with stitching but doesn't pile up
+                    for cleanup_future in cleanup_future_list:
+                        cleanup_future.result()
+                    LOGGER.debug(f'removing {len(workspace_list)} workspaces')
+                    cleanup_future_list = [
+                        _WORKSPACE_CLEANUP_EXECUTOR.submit(
+                            shutil.rmtree, workspace_dir)
+                        for workspace_dir in workspace_list]
+
+                export_raster_list = []
+                modified_load_raster_list = []
+                workspace_list = []
+                watershed_process_count = collections.defaultdict(int)
+
+                _set_work_status(
+                    WORK_STATUS_DATABASE_PATH,
+                    status_update_list)
+                status_update_list = []
+                work_status_updated.set()
+
+                if payload is None:
+                    stitch_queue.put(None)
+                    break
+            for cleanup_future in cleanup_future_list:
+                cleanup_future.result()
+            if payload is None and remove_workspaces is not None:
+                # all done, time to build overview and compress
+                LOGGER.debug(
+                    f'building overviews and compressing results '
+                    f'for {stitch_export_raster_path} and '
+                    f'{stitch_modified_load_raster_path}')
+                build_overview_future_list = []
+                for base_raster_path in [
+                        stitch_export_raster_path,
+                        stitch_modified_load_raster_path]:
+                    upsample_raster_path = os.path.join(
+                        WORKSPACE_DIR,
+                        f'upsample_{os.path.basename(base_raster_path)}')
+                    compressed_raster_path = os.path.join(
+                        WORKSPACE_DIR,
+                        f'compressed_{os.path.basename(base_raster_path)}')
+                    build_overview_future_list.append(stitch_executor.submit(
+                        upsample_compress_and_overview,
                         base_raster_path, upsample_raster_path,
                         compressed_raster_path))
-                build_overview_process.start()
-                build_overview_thread_list.append(build_overview_process)
-            LOGGER.debug('joining the build overview threads')
-            for process in build_overview_thread_list:
-                process.join()
-            LOGGER.debug(f'all done stitching for {scenario_id}')
+                LOGGER.debug('waiting on the build overview processes')
+                for build_overview_future in build_overview_future_list:
+                    build_overview_future.result()
+                LOGGER.debug(f'all done stitching for {scenario_id}')
     except Exception:
         LOGGER.exception(
             f'something bad happened on ndr stitcher for {scenario_id}')
@@ -482,7 +882,7 @@ def _create_watershed_id(watershed_path, watershed_fid):
 
 def _split_watershed_id(watershed_id):
     """Split into watershed basename and fid."""
-    basename, fid = re.match(r'^(.*)_(\d*)$', watershed_id).groups()
+    basename, _, fid = watershed_id.rpartition('_')
     return (basename, int(fid))
 
 
@@ -553,9 +953,60 @@ def ndr_plus_and_stitch(
             [(f'exception happened: {e}', scenario_id, watershed_id)])
 
 
+# biophysical table id -> (eff_n_lucode_map, load_n_lucode_map), set in each
+# watershed worker process by ``_init_ndr_worker``
+_WORKER_LUCODE_MAP_LOOKUP = {}
+
+
+def _init_ndr_worker(lucode_map_lookup):
+    """Process pool initializer that stores the lucode maps in the worker.
+
+    The maps are pickled once per worker process this way instead of with
+    every watershed task.
+
+    Args:
+        lucode_map_lookup (dict): maps a biophysical table id to its
+            ``(eff_n_lucode_map, load_n_lucode_map)`` tuple.
+
+    Return:
+        ``None``
+    """
+    global _WORKER_LUCODE_MAP_LOOKUP
+    _WORKER_LUCODE_MAP_LOOKUP = lucode_map_lookup
+
+
+def _ndr_plus_and_stitch_task(biophysical_table_id, **kwargs):
+    """Call ``ndr_plus_and_stitch`` with this worker's lucode maps.
+
+    Args:
+        biophysical_table_id (str): key into the lookup given to
+            ``_init_ndr_worker``.
+        **kwargs: the rest of the ``ndr_plus_and_stitch`` arguments.
+
+    Return:
+        ``None``
+    """
+    eff_n_lucode_map, load_n_lucode_map = _WORKER_LUCODE_MAP_LOOKUP[
+        biophysical_table_id]
+    ndr_plus_and_stitch(
+        eff_n_lucode_map=eff_n_lucode_map,
+        load_n_lucode_map=load_n_lucode_map, **kwargs)
+
+
+# the strings pandas.read_csv treats as NA by default
+_CSV_NA_VALUES = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+    'nan', 'null'})
+
+
+@functools.lru_cache(maxsize=None)
 def load_biophysical_table(biophysical_table_path, lulc_field_id):
     """Dump the biophysical table to two dictionaries indexable by lulc.
 
+    Results are cached so scenarios sharing a table only parse it once, the
+    returned dictionaries are shared and must not be modified.
+
     Args:
         biophysical_table_path (str): biophysical table that indexes lulc
             codes to 'eff_n' and 'load_n' values. These value can have
@@ -569,19 +1020,24 @@ def load_biophysical_table(biophysical_table_path, lulc_field_id):
         * eff_n_lucode_map: index lulc to nitrogen efficiency
         * load_n_lucode_map: index lulc to base n load
     """
-    biophysical_table = pandas.read_csv(biophysical_table_path)
-    # clean up biophysical table
-    biophysical_table = biophysical_table.fillna(0)
-    biophysical_table.loc[
-        biophysical_table['load_n'] == 'use raster', 'load_n'] = (
-            USE_AG_LOAD_ID)
-    biophysical_table['load_n'] = biophysical_table['load_n'].apply(
-        pandas.to_numeric)
-
-    eff_n_lucode_map = dict(
-            zip(biophysical_table[lulc_field_id], biophysical_table['eff_n']))
-    load_n_lucode_map = dict(
-        zip(biophysical_table[lulc_field_id], biophysical_table['load_n']))
+    def _table_number(value):
+        # blank, missing, and NA cells are treated as 0 like pandas' fillna(0)
+        if value.strip() in _CSV_NA_VALUES:
+            return 0.0
+        number = float(value)
+        return 0.0 if math.isnan(number) else number
+
+    eff_n_lucode_map = {}
+    load_n_lucode_map = {}
+    with open(biophysical_table_path, newline='',
+              encoding='utf-8-sig') as biophysical_table_file:
+        for row in csv.DictReader(biophysical_table_file, restval=''):
+            lucode = int(_table_number(row[lulc_field_id]))
+            eff_n_lucode_map[lucode] = _table_number(row['eff_n'])
+            if row['load_n'].strip() == 'use raster':
+                load_n_lucode_map[lucode] = USE_AG_LOAD_ID
+            else:
+                load_n_lucode_map[lucode] = _table_number(row['load_n'])
     return eff_n_lucode_map, load_n_lucode_map
 
 
@@ -590,7 +1046,42 @@ def unzip(zipfile_path, target_unzip_dir):
     LOGGER.info(f'unzip {zipfile_path} to {target_unzip_dir}')
     os.makedirs(target_unzip_dir, exist_ok=True)
     with zipfile.ZipFile(zipfile_path, 'r') as zip_ref:
-        zip_ref.extractall(target_unzip_dir)
+        member_list = zip_ref.infolist()
+    # make the directories up front so the extract threads don't race to
+    # create the same parents. Member names are cleaned the same way
+    # ``ZipFile.extract`` does so they can't point outside the target.
+    member_dir_set = set()
+    for member in member_list:
+        arcname = member.filename.replace('/', os.path.sep)
+        if os.path.altsep:
+            arcname = arcname.replace(os.path.altsep, os.path.sep)
+        arcname = os.path.splitdrive(arcname)[1]
+        member_dir_set.add(os.path.sep.join(
+            component for component in
+            os.path.dirname(arcname).split(os.path.sep)
+            if component not in ('', os.path.curdir, os.path.pardir)))
+    for member_dir in member_dir_set:
+        os.makedirs(os.path.join(target_unzip_dir, member_dir), exist_ok=True)
+
+    # zlib releases the GIL so members decompress in parallel, each thread
+    # needs its own ZipFile since they share a file position
+    thread_local = threading.local()
+    thread_zip_list = []
+
+    def _extract(member):
+        if not hasattr(thread_local, 'zip_ref'):
+            thread_local.zip_ref = zipfile.ZipFile(zipfile_path, 'r')
+            thread_zip_list.append(thread_local.zip_ref)
+        thread_local.zip_ref.extract(member, target_unzip_dir)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=os.cpu_count()) as unzip_executor:
+            for _ in unzip_executor.map(_extract, member_list):
+                pass
+    finally:
+        for thread_zip_ref in thread_zip_list:
+            thread_zip_ref.close()
 
 
 def unzip_and_build_dem_vrt(
@@ -612,13 +1103,51 @@ def unzip_and_build_dem_vrt(
     """
     unzip(zipfile_path, target_unzip_dir)
     LOGGER.info('build vrt')
-    subprocess.run(
-        f'gdalbuildvrt {target_vrt_path} {expected_tiles_zip_path}/*.tif',
-        shell=True)
+    vrt_raster = gdal.BuildVRT(
+        target_vrt_path,
+        sorted(glob.glob(os.path.join(expected_tiles_zip_path, '*.tif'))))
+    # dereference to flush the vrt to disk
+    vrt_raster = None
     LOGGER.info(f'all done building {target_vrt_path}')
 
 
-def _report_watershed_count():
+def _configure_gdal_cache(n_workers):
+    """Size the GDAL block cache so the ndr workers share 25% of memory.
+
+    If ``GDAL_CACHEMAX`` is already defined in the environment it is left
+    alone and GDAL will use it (including percentage values like "25%").
+    Otherwise the computed per process size is set here and exported to the
+    environment so worker processes inherit it. Stitch processes override
+    it with ``STITCH_GDAL_CACHEMAX`` in ``_init_stitch_process``.
+
+    Args:
+        n_workers (int): number of worker processes that will each hold
+            their own GDAL block cache.
+
+    Return:
+        ``None``
+    """
+    if 'GDAL_CACHEMAX' in os.environ:
+        LOGGER.info(
+            f'using GDAL_CACHEMAX={os.environ["GDAL_CACHEMAX"]} from the '
+            'environment')
+        return
+    total_memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    cache_max = int(total_memory * 0.25 // max(1, n_workers))
+    LOGGER.info(f'setting GDAL cache to {cache_max} bytes per process')
+    gdal.SetCacheMax(cache_max)
+    # values this large are interpreted by GDAL as bytes
+    os.environ['GDAL_CACHEMAX'] = str(cache_max)
+
+
+def _format_duration(seconds):
+    """Format ``seconds`` as hours:minutes:seconds."""
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f'{int(hours)}:{int(minutes):02d}:{seconds:04.1f}'
+
+
+def _report_watershed_count(work_status_updated):
     try:
         start_time = time.time()
         count_to_process_sql = '''
@@ -627,12 +1156,22 @@ def _report_watershed_count():
         original_watershed_to_process_count = _execute_sqlite(
             count_to_process_sql, WORK_STATUS_DATABASE_PATH,
             fetch='one', argument_list=[COMPLETE_STATUS])[0]
-        sleep_time = 15.0
+        # poll on one open connection, and if the writers have the database
+        # locked just skip that report rather than retrying
+        connection = _get_sqlite_connection(
+            WORK_STATUS_DATABASE_PATH, 'read_only')
+        # report when a batch of statuses is committed, or at least this often
+        max_report_interval = 15.0
         while True:
-            time.sleep(sleep_time)
-            current_remaining_to_process = _execute_sqlite(
-                count_to_process_sql, WORK_STATUS_DATABASE_PATH,
-                argument_list=[COMPLETE_STATUS], fetch='one')[0]
+            work_status_updated.wait(timeout=max_report_interval)
+            work_status_updated.clear()
+            try:
+                current_remaining_to_process = connection.execute(
+                    count_to_process_sql, [COMPLETE_STATUS]).fetchone()[0]
+            except sqlite3.OperationalError:
+                REPORT_WATERSHED_LOGGER.debug(
+                    'database busy, skipping this report')
+                continue
 
             watersheds_processed_so_far = (
                 original_watershed_to_process_count - current_remaining_to_process)
@@ -643,20 +1182,11 @@ def _report_watershed_count():
                 seconds_left = current_remaining_to_process / n_processed_per_sec
             else:
                 seconds_left = 99999999999
-            hours_left = int(seconds_left // 3600)
-            seconds_left -= hours_left * 3600
-            minutes_left = int(seconds_left // 60)
-            seconds_left -= minutes_left * 60
-
-            hours_so_far = int(seconds_so_far // 3600)
-            seconds_so_far -= hours_so_far * 3600
-            minutes_so_far = int(seconds_so_far // 60)
-            seconds_so_far -= minutes_so_far * 60
             REPORT_WATERSHED_LOGGER.info(
                 f'\n******\ntotal left: {current_remaining_to_process}'
                 f'\ntotal completed: {original_watershed_to_process_count-current_remaining_to_process}' +
-                f'\ntime left: {hours_left}:{minutes_left:02d}:{seconds_left:04.1f}' +
-                f'\ntime so far: {hours_so_far}:{minutes_so_far:02d}:{seconds_so_far:04.1f}')
+                f'\ntime left: {_format_duration(seconds_left)}' +
+                f'\ntime so far: {_format_duration(seconds_so_far)}')
 
     except Exception:
         REPORT_WATERSHED_LOGGER.exception('something bad happened')
@@ -678,6 +1208,36 @@ def main():
         '--limit_to_scenarios', type=str, nargs='+',
         help='list the scenario keys which this run should only do.')
     args = parser.parse_args()
+    _configure_gdal_cache(args.n_workers)
+    # don't list the (large) DEM tile directory every time a raster is opened
+    os.environ.setdefault('GDAL_DISABLE_READDIR_ON_OPEN', 'EMPTY_DIR')
+
+    LOGGER.debug('starting script')
+    os.makedirs(WORKSPACE_DIR, exist_ok=True)
+    _create_work_table_schema(WORK_STATUS_DATABASE_PATH)
+
+    task_graph = taskgraph.TaskGraph(
+        WORKSPACE_DIR, args.n_workers)
+    os.makedirs(ECOSHARD_DIR, exist_ok=True)
+    ecoshard_path_map = {}
+
+    def _schedule_downloads():
+        for ecoshard_id, ecoshard_url in ECOSHARDS.items():
+            if ecoshard_id in ecoshard_path_map:
+                continue
+            ecoshard_path = os.path.join(
+                ECOSHARD_DIR, os.path.basename(ecoshard_url))
+            task_graph.add_task(
+                func=ecoshard.download_url,
+                args=(ecoshard_url, ecoshard_path),
+                target_path_list=[ecoshard_path])
+            ecoshard_path_map[ecoshard_id] = ecoshard_path
+
+    LOGGER.info('scheduling downloads')
+    LOGGER.debug('starting downloads')
+    # start on the large base DEM and watersheds before loading the scenario
+    # modules so the imports overlap with the download
+    _schedule_downloads()
 
     for scenario_module_name in args.scenario_module_name:
         scenario_module = importlib.import_module(scenario_module_name)
@@ -696,25 +1256,7 @@ def main():
         LOGGER.debug(f'updating SCRUB_IDS with {scenario_module.SCRUB_IDS}')
         SCRUB_IDS.update(scenario_module.SCRUB_IDS)
 
-    LOGGER.debug('starting script')
-    os.makedirs(WORKSPACE_DIR, exist_ok=True)
-    if not os.path.exists(WORK_STATUS_DATABASE_PATH):
-        _create_work_table_schema(WORK_STATUS_DATABASE_PATH)
-
-    task_graph = taskgraph.TaskGraph(
-        WORKSPACE_DIR, args.n_workers)
-    os.makedirs(ECOSHARD_DIR, exist_ok=True)
-    ecoshard_path_map = {}
-    LOGGER.info('scheduling downloads')
-    LOGGER.debug('starting downloads')
-    for ecoshard_id, ecoshard_url in ECOSHARDS.items():
-        ecoshard_path = os.path.join(
-            ECOSHARD_DIR, os.path.basename(ecoshard_url))
-        download_task = task_graph.add_task(
-            func=ecoshard.download_url,
-            args=(ecoshard_url, ecoshard_path),
-            target_path_list=[ecoshard_path])
-        ecoshard_path_map[ecoshard_id] = ecoshard_path
+    _schedule_downloads()
     LOGGER.info('waiting for downloads to finish')
     task_graph.join()
 
@@ -758,6 +1300,8 @@ def main():
     for ecoshard_id, ecoshard_path in ecoshard_path_map.items():
         if ecoshard_path in checked_path_set:
             continue
+        # mark non-rasters as checked too so each path is only opened once
+        checked_path_set.add(ecoshard_path)
         if (pygeoprocessing.get_gis_type(ecoshard_path) ==
                 pygeoprocessing.RASTER_TYPE):
             LOGGER.debug(f'checking {ecoshard_id} {ecoshard_path}')
@@ -768,7 +1312,6 @@ def main():
                 task_name=f'detect invalid values in {ecoshard_path}')
             invalid_value_task_list.append(
                 (ecoshard_id, invalid_value_task))
-            checked_path_set.add(ecoshard_path)
     invalid_raster_list = []
     for ecoshard_id, invalid_value_task in invalid_value_task_list:
         invalid_value_result = invalid_value_task.get()
@@ -781,59 +1324,71 @@ def main():
             '\n'.join([str(x) for x in invalid_raster_list]))
 
     LOGGER.debug('schedule watershed work')
+    # The IGNORE is if it's already in there, keep the status as whatever
+    schedule_watershed_sql = '''
+        INSERT OR IGNORE INTO
+            work_status(
+                scenario_id, watershed_id, watershed_area, status)
+        VALUES(?, ?, ?, ?);
+    '''
+    schedule_argument_list = []
     watershed_path_from_base = {}
     for watershed_path in glob.glob(os.path.join(watershed_dir, '*.shp')):
         watershed_basename = os.path.basename(
             os.path.splitext(watershed_path)[0])
         watershed_path_from_base[watershed_basename] = watershed_path
         watershed_vector = gdal.OpenEx(watershed_path, gdal.OF_VECTOR)
-        watershed_layer = watershed_vector.GetLayer()
+        # let OGR filter on area so only the watersheds to keep come back
+        watershed_layer = watershed_vector.ExecuteSQL(
+            f'SELECT OGR_GEOM_AREA FROM "{watershed_vector.GetLayer().GetName()}" '
+            f'WHERE OGR_GEOM_AREA > {AREA_DEG_THRESHOLD}')
         local_watershed_process_list = [
             (_create_watershed_id(
                 watershed_path, watershed_feature.GetFID())[1],
-             watershed_feature.GetGeometryRef().Area())
-            for watershed_feature in watershed_layer
-            if watershed_feature.GetGeometryRef().Area() >
-            AREA_DEG_THRESHOLD]
-        # The IGNORE is if it's already in there, keep the status as whatever
-        schedule_watershed_sql = '''
-            INSERT OR IGNORE INTO
-                work_status(
-                    scenario_id, watershed_id, watershed_area, status)
-            VALUES(?, ?, ?, ?);
-        '''
-        for scenario_id in SCENARIOS:
-            # schedule all the watersheds that are large enough per scenario
-            # for this particular watershed path
-            argument_list = [
-                (scenario_id, watershed_id, watershed_area,
-                 SCHEDULED_STATUS) for (watershed_id, watershed_area)
-                in local_watershed_process_list]
-            _execute_sqlite(
-                schedule_watershed_sql, WORK_STATUS_DATABASE_PATH,
-                argument_list=argument_list,
-                mode='modify', execute='executemany')
+             watershed_feature.GetField(0))
+            for watershed_feature in watershed_layer]
+        watershed_vector.ReleaseResultSet(watershed_layer)
+        # schedule all the watersheds that are large enough per scenario
+        # for this particular watershed path
+        schedule_argument_list.extend(
+            (scenario_id, watershed_id, watershed_area, SCHEDULED_STATUS)
+            for scenario_id, (watershed_id, watershed_area) in
+            itertools.product(SCENARIOS, local_watershed_process_list))
         watershed_layer = None
         watershed_vector = None
+    # one executemany and one transaction for every scenario and shapefile
+    _execute_sqlite(
+        schedule_watershed_sql, WORK_STATUS_DATABASE_PATH,
+        argument_list=schedule_argument_list,
+        mode='modify', execute='executemany')
 
+    manager = multiprocessing.Manager()
+    # the stitchers run in their own processes so they signal the progress
+    # report through the manager rather than a threading.Event
+    work_status_updated = manager.Event()
     LOGGER.info(f'starting watershed status logger')
     report_watershed_thread = threading.Thread(
-        target=_report_watershed_count)
+        target=_report_watershed_count, args=(work_status_updated,))
     report_watershed_thread.daemon = True
     report_watershed_thread.start()
 
-    manager = multiprocessing.Manager()
-    stitch_worker_list = []
-    stitch_queue_list = []
-    target_raster_list = []
+    stitch_worker_map = {}
+    stitch_queue_map = {}
+    # everything a watershed task needs from its scenario, resolved once
+    scenario_plan = {}
+    lucode_map_lookup = {}
     for scenario_id, scenario_vars in SCENARIOS.items():
-        eff_n_lucode_map, load_n_lucode_map = load_biophysical_table(
-            ecoshard_path_map[scenario_vars['biophysical_table_id']],
-            BIOPHYSICAL_TABLE_IDS[scenario_vars['biophysical_table_id']])
-
-        # make a stitcher for this scenario for export and modified load
-        stitch_queue = manager.Queue()
-        stitch_queue_list.append(stitch_queue)
+        biophysical_table_id = scenario_vars['biophysical_table_id']
+        lucode_map_lookup[biophysical_table_id] = load_biophysical_table(
+            ecoshard_path_map[biophysical_table_id],
+            BIOPHYSICAL_TABLE_IDS[biophysical_table_id])
+
+        # make a stitcher for this scenario for export and modified load, the
+        # queue is bounded so watershed tasks wait rather than pile up
+        # finished workspaces on disk while a batch is being stitched. It
+        # has to be a manager queue since task arguments are pickled.
+        stitch_queue = manager.Queue(STITCH_QUEUE_SIZE)
+        stitch_queue_map[scenario_id] = stitch_queue
         target_export_raster_path = os.path.join(
             WORKSPACE_DIR, f'{scenario_id}_{TARGET_CELL_LENGTH_M:.1f}_{ROUTING_ALGORITHM}_export.tif')
         target_modified_load_raster_path = os.path.join(
@@ -847,47 +1402,130 @@ def main():
             create_empty_wgs84_raster(
                 BASE_WGS84_LENGTH_DEG, -1, target_modified_load_raster_path)
 
-        target_raster_list.extend(
-            [target_export_raster_path, target_modified_load_raster_path])
+        scenario_plan[scenario_id] = (
+            ecoshard_path_map[scenario_vars['lulc_id']],
+            ecoshard_path_map[scenario_vars['precip_id']],
+            ecoshard_path_map[scenario_vars['fertilizer_id']],
+            biophysical_table_id,
+            target_export_raster_path,
+            target_modified_load_raster_path,
+            stitch_queue)
 
-        stitch_worker_thread = threading.Thread(
+        stitch_worker_process = multiprocessing.Process(
             target=stitch_worker,
             args=(
                 scenario_id, target_export_raster_path,
                 target_modified_load_raster_path, stitch_queue,
-                args.watersheds is None))
-        stitch_worker_thread.start()
-        stitch_worker_list.append(stitch_worker_thread)
-
+                args.watersheds is None, work_status_updated))
+        stitch_worker_process.start()
+        stitch_worker_map[scenario_id] = stitch_worker_process
+
+    if args.watersheds:
+        # skip anything requested that's already been completed
+        completed_watersheds_query = f'''
+            SELECT scenario_id, watershed_id FROM work_status
+            WHERE status=? AND watershed_id IN (
+                {', '.join('?' * len(args.watersheds))});'''
+        completed_watershed_set = set(_iterate_sqlite(
+            completed_watersheds_query, WORK_STATUS_DATABASE_PATH,
+            argument_list=[COMPLETE_STATUS, *args.watersheds]))
+        if completed_watershed_set:
+            LOGGER.info(
+                f'skipping already complete watersheds: '
+                f'{sorted(completed_watershed_set)}')
+        watershed_work_list = [
+            (scenario_id, watershed_id) for scenario_id in SCENARIOS
+            for watershed_id in args.watersheds
+            if (scenario_id, watershed_id) not in completed_watershed_set]
+    else:
+        # all scenarios are interleaved largest watershed first so the
+        # longest running work starts early and no scenario drains the pool
         watersheds_to_process_query = '''
-            SELECT watershed_id FROM work_status
-            WHERE scenario_id=? AND status!=?
+            SELECT scenario_id, watershed_id FROM work_status
+            WHERE status!=?
             ORDER BY watershed_area DESC;'''
-
-        if args.watersheds:
-            # make it it a tuple so it matches the sqlite query
-            watershed_id_work_list = [
-                (watershed_id,) for watershed_id in args.watersheds]
-        else:
-            watershed_id_work_list = _execute_sqlite(
+        watershed_work_list = [
+            (scenario_id, watershed_id) for scenario_id, watershed_id in
+            _iterate_sqlite(
                 watersheds_to_process_query, WORK_STATUS_DATABASE_PATH,
-                argument_list=[scenario_id, COMPLETE_STATUS],
-                mode='read_only', execute='execute', fetch='all')
+                argument_list=[COMPLETE_STATUS])
+            if scenario_id in SCENARIOS]
+
+    # a scenario's stitcher is told to finish once all its watersheds are done
+    scenario_remaining_count = collections.Counter(
+        scenario_id for scenario_id, _ in watershed_work_list)
+    for scenario_id, stitch_queue in stitch_queue_map.items():
+        if scenario_remaining_count[scenario_id] == 0:
+            stitch_queue.put(None)
+
+    def _finish_stitch_queue(scenario_id):
+        """Send the stitcher its sentinel unless it has already died."""
+        stitch_worker_process = stitch_worker_map[scenario_id]
+        while stitch_worker_process.is_alive():
+            try:
+                stitch_queue_map[scenario_id].put(
+                    None, timeout=STITCH_WORKER_CHECK_SECONDS)
+                return
+            except queue.Full:
+                continue
 
+    watershed_future_map = {}
+
+    def _collect_finished_watersheds():
+        """Wait for some watersheds to finish and check on the stitchers."""
+        finished_future_set, _ = concurrent.futures.wait(
+            watershed_future_map, timeout=STITCH_WORKER_CHECK_SECONDS,
+            return_when=concurrent.futures.FIRST_COMPLETED)
+        for watershed_future in finished_future_set:
+            # ndr_plus_and_stitch records its own errors, this only raises
+            # if the worker process itself died
+            watershed_future.result()
+            scenario_id = watershed_future_map.pop(watershed_future)
+            scenario_remaining_count[scenario_id] -= 1
+            if scenario_remaining_count[scenario_id] == 0:
+                LOGGER.info(f'all watersheds done for scenario {scenario_id}')
+                _finish_stitch_queue(scenario_id)
+        for scenario_id, stitch_worker_process in stitch_worker_map.items():
+            if (scenario_remaining_count[scenario_id] > 0 and
+                    not stitch_worker_process.is_alive()):
+                raise RuntimeError(
+                    f'stitch worker for {scenario_id} exited with code '
+                    f'{stitch_worker_process.exitcode} with '
+                    f'{scenario_remaining_count[scenario_id]} watersheds '
+                    'left to stitch')
+
+    # the watershed work runs in its own pool, so shut down taskgraph's idle
+    # workers rather than keep them alive for the rest of the run
+    task_graph.join()
+    task_graph.close()
+
+    # the lucode maps go to each worker once rather than with every task
+    n_workers = max(1, args.n_workers)
+    ndr_executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_init_ndr_worker,
+        initargs=(lucode_map_lookup,))
+    # only a few tasks per worker are submitted at a time so the pool doesn't
+    # hold the pickled arguments of every remaining watershed
+    max_pending_watersheds = PENDING_WATERSHEDS_PER_WORKER * n_workers
+    try:
         last_time = time.time()
-        for watershed_index, (watershed_id,) in enumerate(
-                watershed_id_work_list):
-            if time.time()-last_time > 15:
+        for watershed_index, (scenario_id, watershed_id) in enumerate(
+                watershed_work_list):
+            # only check the clock every 1024 watersheds
+            if (watershed_index & 1023) == 0 and time.time()-last_time > 15:
                 LOGGER.debug(
                     f'schedulding {watershed_index} of '
-                    f'{len(watershed_id_work_list)} '
-                    f'{100*watershed_index/(len(watershed_id_work_list)-1):.1f}% complete')
+                    f'{len(watershed_work_list)} '
+                    f'{100*watershed_index/(len(watershed_work_list)-1):.1f}% complete')
                 last_time = time.time()
+            while len(watershed_future_map) >= max_pending_watersheds:
+                _collect_finished_watersheds()
+            (lulc_path, precip_path, fertilizer_path, biophysical_table_id,
+             target_export_raster_path, target_modified_load_raster_path,
+             stitch_queue) = scenario_plan[scenario_id]
             watershed_basename, watershed_fid = _split_watershed_id(
                 watershed_id)
-            watershed_path = os.path.join(
-                watershed_dir, f'{watershed_basename}.shp')
-            watershed_vector = gdal.OpenEx(watershed_path, gdal.OF_VECTOR)
             local_workspace_dir = os.path.join(
                 WORKSPACE_DIR, scenario_id, watershed_id)
             local_export_raster_path = os.path.join(
@@ -896,35 +1534,66 @@ def main():
             local_modified_load_raster_path = os.path.join(
                 local_workspace_dir, os.path.basename(
                     target_modified_load_raster_path))
-            task_graph.add_task(
-                func=ndr_plus_and_stitch,
-                args=(
-                    scenario_id,
-                    watershed_path_from_base[watershed_basename],
-                    watershed_fid,
-                    TARGET_CELL_LENGTH_M,
-                    RETENTION_LENGTH_M,
-                    K_VAL,
-                    FLOW_THRESHOLD,
-                    MAX_PIXEL_FILL_COUNT,
-                    ROUTING_ALGORITHM,
-                    DEM_VRT_PATH,
-                    ecoshard_path_map[scenario_vars['lulc_id']],
-                    ecoshard_path_map[scenario_vars['precip_id']],
-                    ecoshard_path_map[scenario_vars['fertilizer_id']],
-                    eff_n_lucode_map,
-                    load_n_lucode_map,
-                    local_export_raster_path,
-                    local_modified_load_raster_path,
-                    local_workspace_dir,
-                    stitch_queue),
-                task_name=f'{watershed_basename}_{watershed_fid}')
-        LOGGER.info(f'waiting for scenario {scenario_id} to finish.')
-        task_graph.join()
-        stitch_queue.put(None)
+            watershed_future = ndr_executor.submit(
+                _ndr_plus_and_stitch_task,
+                biophysical_table_id,
+                scenario_id=scenario_id,
+                watershed_path=watershed_path_from_base[watershed_basename],
+                watershed_fid=watershed_fid,
+                target_cell_length_m=TARGET_CELL_LENGTH_M,
+                retention_length_m=RETENTION_LENGTH_M,
+                k_val=K_VAL,
+                flow_threshold=FLOW_THRESHOLD,
+                max_pixel_fill_count=MAX_PIXEL_FILL_COUNT,
+                routing_algorithm=ROUTING_ALGORITHM,
+                dem_path=DEM_VRT_PATH,
+                lulc_path=lulc_path,
+                precip_path=precip_path,
+                custom_load_path=fertilizer_path,
+                target_export_raster_path=local_export_raster_path,
+                target_modified_load_raster_path=(
+                    local_modified_load_raster_path),
+                workspace_dir=local_workspace_dir,
+                stitch_queue=stitch_queue)
+            watershed_future_map[watershed_future] = scenario_id
+
+        LOGGER.info('waiting for all watersheds to finish.')
+        while watershed_future_map:
+            _collect_finished_watersheds()
+        ndr_executor.shutdown()
+    except BaseException:
+        LOGGER.exception('watershed scheduling failed, stopping the workers')
+        ndr_executor.shutdown(wait=False, cancel_futures=True)
+        # a running watershed could be blocked on the full queue of a dead
+        # stitcher, drain those queues until the running work is done, the
+        # drained watersheds are left as computed and redone next run
+        dead_stitch_queue_list = [
+            stitch_queue_map[scenario_id]
+            for scenario_id, stitch_worker_process in stitch_worker_map.items()
+            if not stitch_worker_process.is_alive()]
+        while not all(
+                watershed_future.done()
+                for watershed_future in watershed_future_map):
+            if not dead_stitch_queue_list:
+                concurrent.futures.wait(
+                    watershed_future_map, timeout=STITCH_WORKER_CHECK_SECONDS)
+            for stitch_queue in dead_stitch_queue_list:
+                try:
+                    stitch_queue.get(timeout=1)
+                except queue.Empty:
+                    pass
+        raise
+    finally:
+        # live stitchers always get their sentinel so they stitch what they
+        # have and exit rather than waiting on their queues forever
+        for scenario_id in stitch_queue_map:
+            if scenario_remaining_count[scenario_id] > 0:
+                _finish_stitch_queue(scenario_id)
+
+    for scenario_id, stitch_worker_process in stitch_worker_map.items():
         LOGGER.debug(
-            f'joining stitch worker thread for scenario {scenario_id}')
-        stitch_worker_thread.join()
+            f'joining stitch worker process for scenario {scenario_id}')
+        stitch_worker_process.join()
 
     LOGGER.debug('ALL DONE!')
 
@@ -932,6 +1601,9 @@ def main():
 def upsample_compress_and_overview(
         base_raster_path, upsampled_raster_path, target_raster_path):
     """Compress and overview base to raster."""
+    # only set here, in the stitch pool process, so the final compression
+    # uses every core without every ndr worker spawning that many threads
+    gdal.SetConfigOption('GDAL_NUM_THREADS', 'ALL_CPUS')
     ecoshard.convolve_layer(
         base_raster_path, 2, 'sum', upsampled_raster_path)
     ecoshard.compress_raster(upsampled_raster_path, target_raster_path)
@@ -0,0 +1,40 @@
+"""Shared helpers for scenario modules."""
+import collections.abc
+import os
+
+# Host the ecoshard paths are resolved against; override with the
+# ECOSHARD_PREFIX environment variable to point at a closer mirror.
+ECOSHARD_PREFIX = os.environ.get(
+    'ECOSHARD_PREFIX', 'https://storage.googleapis.com/')
+
+
+class EcoshardUrlMap(collections.abc.Mapping):
+    """Read-only map of ecoshard id to URL built on lookup.
+
+    Only the bucket-relative suffix of each ecoshard is stored, the full
+    URL is ``prefix + suffix`` and is constructed when the key is accessed.
+    """
+
+    def __init__(self, suffix_map, prefix=None):
+        """Create the map.
+
+        Args:
+            suffix_map (dict): maps ecoshard id to its path relative to
+                ``prefix``.
+            prefix (str): URL prefix to prepend to each suffix, if ``None``
+                uses ``ECOSHARD_PREFIX``.
+        """
+        self._suffix_map = dict(suffix_map)
+        self._prefix = ECOSHARD_PREFIX if prefix is None else prefix
+
+    def __getitem__(self, key):
+        return self._prefix + self._suffix_map[key]
+
+    def __iter__(self):
+        return iter(self._suffix_map)
+
+    def __len__(self):
+        return len(self._suffix_map)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)!r})'
@@ -0,0 +1,37 @@
+"""Ecoshards shared by the NCI global scenarios.
+
+Paths are relative to ``ECOSHARD_PREFIX``, scenario modules merge the
+groups they use into their own ``EcoshardUrlMap``.
+"""
+# biophysical table and precipitation used by every nci scenario
+NCI_BASE_SUFFIXES = {
+    # Biophysical table:
+    'nci-ndr-biophysical_table_forestry_grazing': 'nci-ecoshards/nci-NDR-biophysical_table_forestry_grazing_md5_7524f2996fcc929ddc3aaccde249d59f.csv',
+    # Precip:
+    'worldclim_2015': 'ipbes-ndr-ecoshard-data/worldclim_2015_md5_16356b3770460a390de7e761a27dbfa1.tif',
+}
+
+# scenario landcover maps
+NCI_LULC_SUFFIXES = {
+    'extensification_bmps_irrigated': 'nci-ecoshards/one_last_run/scenarios0620_extensification_bmps_irrigated_md5_997290bf56ad3776eb271c56d57367d6.tif',
+    'extensification_bmps_rainfed': 'nci-ecoshards/one_last_run/scenarios0620_extensification_bmps_rainfed_md5_5a6382881976ed041499e5c6cb61516d.tif',
+    'extensification_current_practices': 'nci-ecoshards/one_last_run/scenarios052320_extensification_current_practices_md5_8becc0d5210d023efac2be719f0200fb.tif',
+    'extensification_intensified_irrigated': 'nci-ecoshards/one_last_run/scenarios052320_extensification_intensified_irrigated_md5_dcd1c26add8262120ce63d7a101cedab.tif',
+    'extensification_intensified_rainfed': 'nci-ecoshards/one_last_run/scenarios052320_extensification_intensified_rainfed_md5_6d34b0c107ad5655815f7ae624173eb5.tif',
+    'fixedarea_bmps_irrigated': 'nci-ecoshards/one_last_run/scenarios0620_fixedarea_bmps_irrigated_md5_2734856be55518996059a9330304cc0e.tif',
+    'fixedarea_bmps_rainfed': 'nci-ecoshards/one_last_run/scenarios0620_fixedarea_bmps_rainfed_md5_ff56f75f23cedf8d9181c6c7af71cf23.tif',
+    'fixedarea_intensified_irrigated': 'nci-ecoshards/one_last_run/scenarios052320_fixedarea_intensified_irrigated_md5_0b96c3ff00696a454d6c2fffb2ee1415.tif',
+    'fixedarea_intensified_rainfed': 'nci-ecoshards/one_last_run/scenarios052320_fixedarea_intensified_rainfed_md5_ec3a78c825186a12c16f3f7442eb03f4.tif',
+    'grazing_expansion_lulc': 'nci-ecoshards/one_last_run/scenarios0221_grazing_expansion_md5_140803bc8aef02a1742aa1d1757e9e76.tif',
+    'restoration': 'nci-ecoshards/one_last_run/scenarios0221_restoration_md5_16450b43f0a232b32a847c9738affda3.tif',
+    'sustainable_current': 'nci-ecoshards/one_last_run/scenarios0321_sustainable_current_md5_82afe022ffa8485a9b10154ee844b54f.tif',
+}
+
+# RevB fertilizer application rates
+NCI_REVB_FERTILIZER_SUFFIXES = {
+    'intensificationnapp_allcrops_irrigated_max_model_and_observednapprevb_bmps': 'nci-ecoshards/scenarios050420/IntensificationNapp_allcrops_irrigated_max_Model_and_observedNappRevB_BMPs_md5_ddc000f7ce7c0773039977319bcfcf5d.tif',
+    'intensificationnapp_allcrops_rainfed_max_model_and_observednapprevb_bmps': 'nci-ecoshards/scenarios050420/IntensificationNapp_allcrops_rainfed_max_Model_and_observedNappRevB_BMPs_md5_fa2684c632ec2d0e0afb455b41b5d2a6.tif',
+    'extensificationnapp_allcrops_rainfedfootprint_gapfilled_observednapprevb': 'nci-ecoshards/scenarios050420/ExtensificationNapp_allcrops_rainfedfootprint_gapfilled_observedNappRevB_md5_1185e457751b672c67cc8c6bf7016d03.tif',
+    'intensificationnapp_allcrops_irrigated_max_model_and_observednapprevb': 'nci-ecoshards/scenarios050420/IntensificationNapp_allcrops_irrigated_max_Model_and_observedNappRevB_md5_9331ed220772b21f4a2c81dd7a2d7e10.tif',
+    'intensificationnapp_allcrops_rainfed_max_model_and_observednapprevb': 'nci-ecoshards/scenarios050420/IntensificationNapp_allcrops_rainfed_max_Model_and_observedNappRevB_md5_1df3d8463641ffc6b9321e73973f3444.tif',
+}